@@ -2,14 +2,29 @@
 # Audio synthesis with harmonics for theremin sound generation
 
 import numpy as np
-import sounddevice as sd
+import rtmixer
+from numba import njit
+import math
 import threading
 import queue
+import time
+import os
+import sys
+import ctypes
+import ctypes.util
 
 # ===== CONFIG =====
 SAMPLE_RATE = 44100  # Hz
 CHUNK_DURATION = 0.05  # seconds
 CHUNK_SIZE = int(SAMPLE_RATE * CHUNK_DURATION)
+RING_BUFFER_SIZE = 8192  # samples, must be a power of 2 (~186 ms)
+TARGET_FILL = 2 * CHUNK_SIZE  # samples kept queued ahead of the device (~100 ms)
+VIZ_DECIMATION = 20  # keep every Nth sample of a chunk for the frontend
+SYNTH_PRIORITY = 80  # SCHED_FIFO priority for the synthesis thread (1-99)
+
+# mlockall flags from <sys/mman.h>
+MCL_CURRENT = 1
+MCL_FUTURE = 2
 
 # Harmonic ratios for instrument-like timbre
 HARMONIC_RATIOS = [
@@ -20,86 +35,148 @@ HARMONIC_RATIOS = [
     (5.0, 0.08),   # 5th harmonic
 ]
 
+# Harmonics as arrays for the compiled tone kernel
+HARMONIC_MULTS = np.array([mult for mult, _ in HARMONIC_RATIOS])
+HARMONIC_AMPS = np.array([amp for _, amp in HARMONIC_RATIOS])
+
+# normalize to prevent clipping
+INV_MAX_AMPLITUDE = 1.0 / sum([amp for _, amp in HARMONIC_RATIOS])
+
 # ===== GLOBAL STATE =====
-current_frequency = 440.0
-current_volume = 0.5
-is_playing = False
+# (frequency, volume, playing), replaced as a whole so readers never see a partial update
+_params = (440.0, 0.5, False)
+
+# fundamental phase in cycles, carried across chunks so the waveform stays continuous
+_phase = 0.0
 
 # Audio stream
 audio_stream = None
 audio_queue = queue.Queue(maxsize=10)
 
+# synthesis thread writes float32 samples here, the C audio callback drains it
+ring_buffer = rtmixer.RingBuffer(np.dtype(np.float32).itemsize, RING_BUFFER_SIZE)
+synth_thread = None
+synth_running = threading.Event()
+playback_action = None
+
+# chunk buffer for the synthesis loop, allocated once so it never allocates
+_chunk = np.zeros(CHUNK_SIZE, dtype=np.float32)
+
+# decimated copy of the latest chunk for visualization
+_viz_buf = _chunk[::VIZ_DECIMATION].copy()
+
 # ===== AUDIO GENERATION =====
-def generate_tone(frequency, volume, duration):
-    """Generate audio chunk with harmonics"""
-    # time array
-    t = np.linspace(0, duration, int(SAMPLE_RATE * duration), endpoint=False)
-    
-    # start with silence
-    waveform = np.zeros_like(t)
-    
-    # add each harmonic
-    for harmonic_mult, amplitude_mult in HARMONIC_RATIOS:
-        harmonic_freq = frequency * harmonic_mult
-        harmonic_wave = amplitude_mult * np.sin(2 * np.pi * harmonic_freq * t)
-        waveform += harmonic_wave
-    
-    # normalize to prevent clipping
-    max_amplitude = sum([amp for _, amp in HARMONIC_RATIOS])
-    waveform = waveform / max_amplitude
-    
-    # apply volume
-    waveform = waveform * volume
-    
-    return waveform.astype(np.float32)
+@njit(fastmath=True, cache=True)
+def _tone(freq, vol, out, phase, sr, mults, amps, inv_max):
+    """Fill out with the harmonic sum starting at phase, return the next phase"""
+    out[:] = 0.0
+    for k in range(mults.size):
+        # per-sample rotation and starting point of this harmonic's oscillator
+        w = 2.0 * math.pi * freq * mults[k] / sr
+        rot_c, rot_s = math.cos(w), math.sin(w)
+        theta = 2.0 * math.pi * mults[k] * phase
+        z_c, z_s = math.cos(theta), math.sin(theta)
+        gain = amps[k] * vol * inv_max
+        # advance by complex multiplication instead of calling sin per sample
+        for i in range(out.size):
+            out[i] += gain * z_s
+            z_c, z_s = z_c * rot_c - z_s * rot_s, z_c * rot_s + z_s * rot_c
+    # harmonics are whole multiples, so wrapping the fundamental keeps them in phase
+    return (phase + out.size * freq / sr) % 1.0
 
-def generate_silence(duration):
-    """Generate silence chunk"""
-    num_samples = int(SAMPLE_RATE * duration)
-    return np.zeros(num_samples, dtype=np.float32)
+def generate_tone(frequency, volume, out):
+    """Generate one chunk with harmonics into out"""
+    global _phase
+
+    _phase = _tone(frequency, volume, out, _phase, SAMPLE_RATE,
+                   HARMONIC_MULTS, HARMONIC_AMPS, INV_MAX_AMPLITUDE)
 
 ### Remaining code in this file is fully or mostly AI-generated
 
-def audio_callback(outdata, frames, time_info, status):
-    """Called by sounddevice to get next audio chunk"""
-    global current_frequency, current_volume, is_playing
-    
-    if status:
-        print(f"Audio callback status: {status}")
+def fill_chunk(out):
+    """Fill out with the next audio chunk"""
+    frequency, volume, playing = _params
     
     try:
         # check if sound should play
-        if is_playing and current_frequency > 0:
+        if playing and frequency > 0:
             # generate tone
-            chunk = generate_tone(current_frequency, current_volume, CHUNK_DURATION)
+            generate_tone(frequency, volume, out)
         else:
             # generate silence
-            chunk = generate_silence(CHUNK_DURATION)
-        
-        # copy to output buffer
-        outdata[:] = chunk.reshape(-1, 1)
+            out.fill(0)
         
     except Exception as e:
-        print(f"Error in audio callback: {e}")
-        outdata[:] = np.zeros((frames, 1), dtype=np.float32)
+        print(f"Error generating audio chunk: {e}")
+        out.fill(0)
+
+def synthesis_loop():
+    """Keep the ring buffer a couple of chunks ahead of the audio device"""
+    global playback_action
+    
+    set_realtime_priority()
+    
+    while synth_running.is_set():
+        # (re)start playback once primed; rtmixer drops the action on any underrun
+        if ring_buffer.read_available >= TARGET_FILL and playback_action not in audio_stream.actions:
+            playback_action = audio_stream.play_ringbuffer(ring_buffer)
+        
+        # stay only TARGET_FILL ahead so hand movements are heard promptly
+        if ring_buffer.read_available >= TARGET_FILL:
+            time.sleep(CHUNK_DURATION / 4)
+            continue
+        
+        fill_chunk(_chunk)
+        ring_buffer.write(_chunk)
+        np.copyto(_viz_buf, _chunk[::VIZ_DECIMATION])
+
+# ===== REAL-TIME SETUP =====
+def set_realtime_priority():
+    """Run the calling thread under SCHED_FIFO so other threads can't preempt it"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(SYNTH_PRIORITY))
+    except (AttributeError, OSError) as e:
+        # not Linux, or missing CAP_SYS_NICE / rtprio limit
+        print(f"Could not set real-time priority for audio synthesis: {e}")
+
+def lock_memory():
+    """Lock current and future pages in RAM so the audio path never page faults"""
+    if not sys.platform.startswith('linux'):
+        return
+    
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            # usually RLIMIT_MEMLOCK too low without CAP_IPC_LOCK
+            print(f"Could not lock memory: {os.strerror(ctypes.get_errno())}")
+    except (AttributeError, OSError) as e:
+        # libc not found or has no mlockall
+        print(f"Could not lock memory: {e}")
 
 def start_audio_stream():
     """Init and start audio output stream"""
-    global audio_stream
+    global audio_stream, synth_thread
     
     try:
-        # create output stream
-        audio_stream = sd.OutputStream(
+        # create mixer (its audio callback is implemented in C)
+        audio_stream = rtmixer.Mixer(
             samplerate=SAMPLE_RATE,
             channels=1,
             blocksize=CHUNK_SIZE,
-            callback=audio_callback,
-            dtype=np.float32,
             device=4
         )
         
-        # start stream
+        # compile the tone kernel before the synthesis loop needs it
+        _tone(0.0, 0.0, _chunk, 0.0, SAMPLE_RATE,
+              HARMONIC_MULTS, HARMONIC_AMPS, INV_MAX_AMPLITUDE)
+        
+        # start stream (silent until the synthesis loop queues the ring buffer)
         audio_stream.start()
+        
+        # start synthesis, it starts ring buffer playback once primed
+        synth_running.set()
+        synth_thread = threading.Thread(target=synthesis_loop, daemon=True)
+        synth_thread.start()
         print("Audio stream started")
         
     except Exception as e:
@@ -107,7 +184,12 @@ def start_audio_stream():
 
 def stop_audio_stream():
     """Stop audio output stream"""
-    global audio_stream
+    global audio_stream, synth_thread
+    
+    # stop synthesis first so it can't queue playback on a closed stream
+    if synth_thread is not None:
+        synth_running.clear()
+        synth_thread.join()
     
     if audio_stream is not None:
         audio_stream.stop()
@@ -116,31 +198,20 @@ def stop_audio_stream():
 
 def update_audio_params(frequency, volume, playing):
     """Update audio parameters from sensor data"""
-    global current_frequency, current_volume, is_playing
+    global _params
     
-    current_frequency = frequency
-    current_volume = volume
-    is_playing = playing
+    _params = (frequency, volume, playing)
 
 def get_current_waveform():
-    """Get current waveform for visualization"""
-    global current_frequency, current_volume, is_playing
-    
-    if is_playing and current_frequency > 0:
-        # generate short sample for viz
-        sample_duration = 0.02  # 20ms
-        waveform = generate_tone(current_frequency, current_volume, sample_duration)
-        # downsample for frontend (send every Nth sample)
-        downsampled = waveform[::20]  # ~1000 points
-        return downsampled.tolist()
-    else:
-        # return silence
-        return [0.0] * 50
+    """Get current waveform for visualization (float32 array, overwritten every chunk)"""
+    # decimated snapshot of the last synthesized chunk (silence when not playing)
+    return _viz_buf
 
 # ===== INIT =====
 def init_audio():
     """Initialize audio system"""
     print("Initializing audio engine...")
+    lock_memory()
     start_audio_stream()
 
 def cleanup_audio():
@@ -4,7 +4,7 @@
 from paho.mqtt import client as mqtt
 import grovepi
 import time
-from collections import deque
+import struct
 
 # ===== CONFIG =====
 LAPTOP_IP = "172.20.10.12"
@@ -19,17 +19,19 @@ FILTER_WINDOW_SIZE = 5  # averages 5 readings
 DISTANCE_MIN = 2  # cm - minimum threshold
 DISTANCE_MAX = 25  # cm - maximum threshold
 
+DEBUG = False  # print every reading (20 Hz)
+
 # ===== MQTT SETUP =====
-mqtt_client = mqtt.Client()
+mqtt_client = mqtt.Client(client_id="rpi", protocol=mqtt.MQTTv5)
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties=None):
     """When MQTT connects to broker"""
     if rc == 0:
         print("Connected to MQTT broker successfully")
     else:
         print("Failed to connect, return code {}".format(rc))
 
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, rc, properties=None):
     """When MQTT disconnects"""
     print("Disconnected from MQTT broker")
 
@@ -42,24 +44,28 @@ mqtt_client.connect(LAPTOP_IP, MQTT_PORT, 60)
 mqtt_client.loop_start()  # start MQTT in background thread
 
 # ===== SENSOR FILTERING =====
-# Moving average filter for ultrasonic sensor
-distance_buffer = deque(maxlen=FILTER_WINDOW_SIZE)
+# Moving average filter for ultrasonic sensor (ring buffer with running sum)
+distance_buffer = [0.0] * FILTER_WINDOW_SIZE
+distance_index = 0
+distance_count = 0
+distance_total = 0.0
 
 def get_filtered_distance():
     """Read ultrasonic sensor and apply moving average filter"""
+    global distance_index, distance_count, distance_total
+    
     try:
         # read raw distance
         raw_distance = grovepi.ultrasonicRead(ULTRASONIC_PORT)
         
-        # add to buffer
-        distance_buffer.append(raw_distance)
+        # replace oldest reading and update running sum
+        distance_total += raw_distance - distance_buffer[distance_index]
+        distance_buffer[distance_index] = raw_distance
+        distance_index = (distance_index + 1) % FILTER_WINDOW_SIZE
+        distance_count = min(distance_count + 1, FILTER_WINDOW_SIZE)
         
         # calculate moving average
-        if len(distance_buffer) > 0:
-            filtered_distance = sum(distance_buffer) / float(len(distance_buffer))
-            return filtered_distance
-        else:
-            return raw_distance
+        return distance_total / distance_count
             
     except Exception as e:
         print("Error reading ultrasonic sensor: {}".format(e))
@@ -97,14 +103,12 @@ def main():
             
             # only publish if readings are valid
             if distance is not None and volume is not None:
-                # publish distance
-                mqtt_client.publish("sensors/distance", str(distance))
-                
-                # publish volume
-                mqtt_client.publish("sensors/volume", str(volume))
+                # publish distance and volume together (two little-endian floats)
+                mqtt_client.publish("sensors/state", struct.pack('<ff', distance, volume), qos=0)
                 
                 # print for debugging
-                print("Distance: {:.1f}cm | Volume: {:.2f}".format(distance, volume))
+                if DEBUG:
+                    print("Distance: {:.1f}cm | Volume: {:.2f}".format(distance, volume))
             
             # Sleep to maintain publish rate
             time.sleep(sleep_time)
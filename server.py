@@ -4,9 +4,12 @@
 from paho.mqtt import client as mqtt
 from flask import Flask, render_template
 from flask_socketio import SocketIO
+import orjson
 import threading
 import time
 import math
+import struct
+import queue
 
 import audio_engine
 
@@ -22,9 +25,27 @@ BUFFER_MAX = 27 # cm - a little bit higher for low base tone
 FREQ_MIN = 256  # C4
 FREQ_MAX = 1024  # C6
 
+DEBUG = False  # print every sensor reading (20 Hz)
+
+# Linear distance -> freq map (near = high), precomputed once
+FREQ_SLOPE = -(FREQ_MAX - FREQ_MIN) / (DISTANCE_MAX - DISTANCE_MIN)
+FREQ_INTERCEPT = FREQ_MAX - FREQ_SLOPE * DISTANCE_MIN
+
+# ===== JSON CODEC =====
+class OrjsonCodec:
+    """Stand-in json module so Socket.IO packets are encoded with orjson"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
 # ===== FLASK INIT =====
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', json=OrjsonCodec)
 
 # ===== GLOBAL VARS =====
 current_distance = 0.0
@@ -32,6 +53,17 @@ current_volume = 0.5
 current_frequency = 0.0
 is_playing = False
 
+# last audio state sent to browsers (frequency, volume, distance, playing)
+last_state = None
+
+# MQTT messages waiting for the worker thread (topic, payload)
+# sensors/state is queued as (topic, None) and read from latest_state instead
+state_queue = queue.Queue()
+
+# newest unprocessed sensors/state payload (only the latest reading matters)
+latest_state = None
+latest_state_lock = threading.Lock()
+
 # ===== FREQUENCY QUANTIZATION =====
 def quantize_to_half_semitone(raw_freq, base_freq=432.0):
     """
@@ -53,55 +85,49 @@ def quantize_to_half_semitone(raw_freq, base_freq=432.0):
     return quantized_freq
 
 # ===== MQTT CALLBACKS =====
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, reason_code, properties):
     """When MQTT connects to broker"""
-    if rc == 0:
+    if reason_code == 0:
         print("Connected to MQTT broker")
         # sub to sensor topics
-        client.subscribe("sensors/distance")
-        client.subscribe("sensors/volume")
-        client.subscribe("control/status")
+        client.subscribe("sensors/state", qos=0)
+        client.subscribe("control/status", qos=0)
         print("Subscribed to sensor topics")
     else:
-        print(f"Failed to connect to MQTT broker, return code {rc}")
+        print(f"Failed to connect to MQTT broker, return code {reason_code}")
 
 def on_message(client, userdata, msg):
-    """When MQTT message arrives"""
+    """When MQTT message arrives, hand it to the worker and return"""
+    global latest_state
+    
+    if msg.topic == "sensors/state":
+        # overwrite any reading the worker hasn't picked up yet
+        with latest_state_lock:
+            already_queued = latest_state is not None
+            latest_state = msg.payload
+        # queue a wakeup unless one is already waiting for this slot
+        if not already_queued:
+            state_queue.put_nowait((msg.topic, None))
+    else:
+        # status messages are rare and always kept
+        state_queue.put_nowait((msg.topic, msg.payload))
+
+def process_message(topic, payload):
+    """Apply one MQTT message to the theremin state"""
     global current_distance, current_volume, current_frequency, is_playing
     
     try:
-        # parse msg
-        topic = msg.topic
-        value = float(msg.payload.decode())
-        
-        if topic == "sensors/distance":
-            current_distance = value
+        if topic == "sensors/state":
+            current_distance, current_volume = struct.unpack('<ff', payload)
 
-            # Calculate freq from dist
-            if DISTANCE_MIN <= current_distance <= DISTANCE_MAX:
- 
-                # Map dist to freq
-                normalized = (current_distance - DISTANCE_MIN) / (DISTANCE_MAX - DISTANCE_MIN)
-                raw_frequency = FREQ_MIN + (FREQ_MAX - FREQ_MIN) * (1 - normalized)
+            # Calculate freq from dist (buffer zones clamp to the nearest threshold)
+            if BUFFER_MIN <= current_distance <= BUFFER_MAX:
+                current_distance = max(DISTANCE_MIN, min(DISTANCE_MAX, current_distance))
 
-                # Quantize to half-semitone intervals in A432 tuning
-                current_frequency = quantize_to_half_semitone(raw_frequency)
+                # Map dist to freq, then quantize to half-semitone intervals in A432 tuning
+                current_frequency = quantize_to_half_semitone(FREQ_INTERCEPT + FREQ_SLOPE * current_distance)
 
                 is_playing = True
-
-            elif DISTANCE_MAX <= current_distance <= BUFFER_MAX:
-                current_distance = 25
-                normalized = (current_distance - DISTANCE_MIN) / (DISTANCE_MAX - DISTANCE_MIN)
-                raw_frequency = FREQ_MIN + (FREQ_MAX - FREQ_MIN) * (1 - normalized)
-                current_frequency = quantize_to_half_semitone(raw_frequency)
-                is_playing = True
-
-            elif BUFFER_MIN <= current_distance <= DISTANCE_MIN:
-                current_distance = 2
-                normalized = (current_distance - DISTANCE_MIN) / (DISTANCE_MAX - DISTANCE_MIN)
-                raw_frequency = FREQ_MIN + (FREQ_MAX - FREQ_MIN) * (1 - normalized)
-                current_frequency = quantize_to_half_semitone(raw_frequency)
-                is_playing = True
                 
             else:
                 # silence outside thresh
@@ -109,28 +135,37 @@ def on_message(client, userdata, msg):
                 is_playing = False
             
             # print audio state - AI generated section
-            if is_playing:
-                print(f"PLAYING | Freq: {current_frequency:.1f} Hz | Vol: {current_volume:.2f} | Dist: {current_distance:.1f}cm")
-            else:
-                print(f"SILENT  | Distance: {current_distance:.1f}cm (outside threshold)")
-        
-        elif topic == "sensors/volume":
-            current_volume = value
+            if DEBUG:
+                if is_playing:
+                    print(f"PLAYING | Freq: {current_frequency:.1f} Hz | Vol: {current_volume:.2f} | Dist: {current_distance:.1f}cm")
+                else:
+                    print(f"SILENT  | Distance: {current_distance:.1f}cm (outside threshold)")
         
         elif topic == "control/status":
-            print(f"Status: {msg.payload.decode()}")
+            print(f"Status: {payload.decode()}")
         
-        # broadcast current state to all connected browsers
-        broadcast_state()
-
         # aduio engine update
         audio_engine.update_audio_params(current_frequency, current_volume, is_playing)
         
     except Exception as e:
         print(f"Error processing MQTT message: {e}")
 
+def message_worker():
+    """Process queued MQTT messages off the MQTT network thread"""
+    global latest_state
+    
+    while True:
+        topic, payload = state_queue.get()
+        
+        if topic == "sensors/state":
+            # take the newest reading, older ones were overwritten
+            with latest_state_lock:
+                payload, latest_state = latest_state, None
+        
+        process_message(topic, payload)
+
 # ===== MQTT INIT =====
-mqtt_client = mqtt.Client()
+mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="theremin-server", protocol=mqtt.MQTTv5)
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
@@ -144,6 +179,10 @@ def start_mqtt():
 mqtt_thread = threading.Thread(target=start_mqtt, daemon=True)
 mqtt_thread.start()
 
+# Start MQTT message worker in background thread
+message_thread = threading.Thread(target=message_worker, daemon=True)
+message_thread.start()
+
 # Init audio engine
 audio_engine.init_audio()
 
@@ -159,6 +198,15 @@ def broadcast_state():
     }
     socketio.emit('audio_state', state_data)
 
+def broadcast_state_if_changed():
+    """Send current audio state only if it differs from the last one sent"""
+    global last_state
+    
+    state = (current_frequency, current_volume, current_distance, is_playing)
+    if state != last_state:
+        last_state = state
+        broadcast_state()
+
 def broadcast_sensor_update():
     """Send sensor readings to browsers"""
     sensor_data = {
@@ -188,19 +236,19 @@ def handle_disconnect():
 
 # ===== BACKGROUND TASK ===== AI-generated section
 def background_broadcast():
-    """Periodically broadcast sensor data for visualization"""
+    """Periodically broadcast audio state and sensor data for visualization"""
     while True:
+        broadcast_state_if_changed()
         broadcast_sensor_update()
 
-        # get and broadcast waveform data
+        # get and broadcast waveform data (raw float32 bytes)
         waveform = audio_engine.get_current_waveform()
-        socketio.emit('waveform_data', {'samples': waveform})
+        socketio.emit('waveform_data', waveform.tobytes())
 
-        time.sleep(0.05)  # 20 Hz
+        socketio.sleep(0.05)  # 20 Hz
 
-# Start background broadcasting - AI generated section
-broadcast_thread = threading.Thread(target=background_broadcast, daemon=True)
-broadcast_thread.start()
+# Start background broadcasting on the Socket.IO server's own worker - AI generated section
+broadcast_task = socketio.start_background_task(background_broadcast)
 
 # ===== MAIN =====
 if __name__ == '__main__':
@@ -11,6 +11,7 @@ const frequencyHistory = {
     values: []
 };
 const MAX_HISTORY_SECONDS = 20;  // 20 second window
+let currentFrequency = 0;  // last frequency from audio_state
 
 // ===== SOCKET EVENT HANDLERS =====
 
@@ -57,8 +58,8 @@ socket.on('audio_state', (data) => {
         status_text.textContent = 'SILENT';
     }
     
-    // add frequency to history for chart
-    add_frequency_point(data.frequency);
+    // remember frequency for chart (audio_state is only sent on change)
+    currentFrequency = data.frequency;
 });
 
 // Sensor update (distance, volume with timestamp)
@@ -66,11 +67,14 @@ socket.on('sensor_update', (data) => {
     // update distance display
     const distance_display = document.getElementById('distance-display');
     distance_display.textContent = data.distance.toFixed(1) + ' cm';
+    
+    // add frequency to history for chart (sensor_update arrives at a steady 20 Hz)
+    add_frequency_point(currentFrequency);
 });
 
-// Waveform data
+// Waveform data (binary float32 samples)
 socket.on('waveform_data', (data) => {
-    draw_waveform(data.samples);
+    draw_waveform(new Float32Array(data));
 });
 
 // ===== HELPER FUNCTIONS =====
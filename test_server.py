@@ -3,9 +3,9 @@
 
 from flask import Flask, render_template
 from flask_socketio import SocketIO
-import threading
 import time
 import math
+import numpy as np
 
 # ===== FLASK INIT =====
 app = Flask(__name__)
@@ -14,6 +14,9 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 # ===== MOCK DATA GENERATION =====
 mock_time = 0.0
 
+# mock waveform never changes, so encode it once (raw float32 bytes)
+MOCK_WAVEFORM = np.sin(2 * np.pi * np.arange(200) / 50).astype(np.float32).tobytes()
+
 def generate_mock_data():
     """Generate realistic mock sensor data"""
     global mock_time
@@ -58,13 +61,10 @@ def generate_mock_data():
             'timestamp': time.time()
         })
         
-        # emit mock waveform data
-        waveform_samples = [math.sin(2 * math.pi * i / 50) for i in range(200)]
-        socketio.emit('waveform_data', {
-            'samples': waveform_samples
-        })
+        # emit mock waveform data (raw float32 bytes, like the real server)
+        socketio.emit('waveform_data', MOCK_WAVEFORM)
         
-        time.sleep(0.05)  # 20 Hz update rate
+        socketio.sleep(0.05)  # 20 Hz update rate
 
 # ===== FLASK ROUTES =====
 @app.route('/')
@@ -91,9 +91,8 @@ if __name__ == '__main__':
     print("This will show MOCK DATA for testing")
     print("=" * 50)
     
-    # start mock data generation in background thread
-    mock_thread = threading.Thread(target=generate_mock_data, daemon=True)
-    mock_thread.start()
+    # start mock data generation as a Socket.IO background task
+    socketio.start_background_task(generate_mock_data)
     
     # run Flask-SocketIO server
     socketio.run(app, host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file